@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Static shard builder for the county health data
+
+This script was created with assistance from Claude AI (Anthropic).
+
+Pre-materializes per-ZIP JSON files (public/county/<zip[:2]>/<zip>.json, keyed
+by measure name inside) so the dataset can be served straight from a CDN or
+static host with no database on the hot path.
+
+Note: flattening the full zip/measure join is ~24M rows, so building every ZIP
+produces several GB of output. Pass one or more ZIP prefixes to shard only a
+subset (e.g. "02" for New England ZIPs).
+
+Usage: python3 build_static_shards.py <database.db> <output_dir> [zip_prefix ...]
+"""
+
+import sys
+import os
+import sqlite3
+
+import orjson
+
+from csv_to_sqlite import create_zip_measure_view
+
+def build_shards(database_path, output_dir, zip_prefixes=None):
+    """Write one JSON shard per ZIP code; returns the number of shards written"""
+    conn = sqlite3.connect(database_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    # Databases built before the view existed don't have it yet
+    create_zip_measure_view(cursor)
+    conn.commit()
+
+    if zip_prefixes:
+        clauses = ' OR '.join(['zip LIKE ?'] * len(zip_prefixes))
+        zip_query = f"SELECT DISTINCT zip FROM zip_county WHERE {clauses} ORDER BY zip"
+        params = [f"{prefix}%" for prefix in zip_prefixes]
+    else:
+        zip_query = "SELECT DISTINCT zip FROM zip_county ORDER BY zip"
+        params = []
+
+    zips = [row["zip"] for row in cursor.execute(zip_query, params)]
+
+    shard_count = 0
+    for zip_code in zips:
+        cursor.execute(
+            """
+            SELECT state, county, state_code, county_code, year_span,
+                   measure_name, measure_id, numerator, denominator, raw_value,
+                   confidence_interval_lower_bound, confidence_interval_upper_bound,
+                   data_release_year, fipscode
+            FROM zip_measure
+            WHERE zip = ?
+            """,
+            (zip_code,)
+        )
+
+        # Group the rows by measure so clients can index straight into them
+        by_measure = {}
+        for row in cursor.fetchall():
+            by_measure.setdefault(row["measure_name"], []).append(dict(row))
+
+        if not by_measure:
+            continue
+
+        shard_dir = os.path.join(output_dir, "county", zip_code[:2])
+        os.makedirs(shard_dir, exist_ok=True)
+        with open(os.path.join(shard_dir, f"{zip_code}.json"), 'wb') as shard:
+            shard.write(orjson.dumps(by_measure))
+        shard_count += 1
+
+    conn.close()
+    return shard_count
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python3 build_static_shards.py <database.db> <output_dir> [zip_prefix ...]",
+              file=sys.stderr)
+        sys.exit(1)
+
+    database_path = sys.argv[1]
+    output_dir = sys.argv[2]
+    zip_prefixes = sys.argv[3:]
+
+    if not os.path.exists(database_path):
+        print(f"Error: database '{database_path}' not found", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        shard_count = build_shards(database_path, output_dir, zip_prefixes)
+    except sqlite3.Error as e:
+        print(f"SQLite error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Wrote {shard_count} ZIP shards to '{output_dir}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""Shared pytest configuration
+
+Created with assistance from Claude AI (Anthropic).
+"""
+
+import pytest
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--live", action="store_true", default=False,
+        help="run the live API tests (builds data.db and boots uvicorn)"
+    )
+
+def pytest_collection_modifyitems(config, items):
+    """Skip live tests unless --live is passed, so everyday runs never pay
+    the database-build and server-boot cost"""
+    if config.getoption("--live"):
+        return
+    skip_live = pytest.mark.skip(reason="needs --live to run")
+    for item in items:
+        if "live" in item.keywords:
+            item.add_marker(skip_live)
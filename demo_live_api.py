@@ -12,30 +12,27 @@ import time
 import httpx
 import json
 
+from csv_to_sqlite import convert
+
 def create_database_if_needed():
     """Create database with real data if it doesn't exist"""
     import os
     if not os.path.exists("data.db"):
         print("🔄 Creating database with real assignment data...")
 
-        result1 = subprocess.run([
-            sys.executable, "csv_to_sqlite.py", "data.db", "data/zip_county.csv"
-        ], capture_output=True, text=True)
-
-        if result1.returncode == 0:
-            print(f"✅ ZIP County data: {result1.stdout.strip()}")
-        else:
-            print(f"❌ Failed to import ZIP data: {result1.stderr}")
+        # Import in-process instead of forking an interpreter per CSV
+        try:
+            row_count, table_name = convert("data.db", "data/zip_county.csv")
+            print(f"✅ ZIP County data: {row_count} rows into '{table_name}'")
+        except Exception as e:
+            print(f"❌ Failed to import ZIP data: {e}")
             return False
 
-        result2 = subprocess.run([
-            sys.executable, "csv_to_sqlite.py", "data.db", "data/county_health_rankings.csv"
-        ], capture_output=True, text=True)
-
-        if result2.returncode == 0:
-            print(f"✅ Health Rankings data: {result2.stdout.strip()}")
-        else:
-            print(f"❌ Failed to import health data: {result2.stderr}")
+        try:
+            row_count, table_name = convert("data.db", "data/county_health_rankings.csv")
+            print(f"✅ Health Rankings data: {row_count} rows into '{table_name}'")
+        except Exception as e:
+            print(f"❌ Failed to import health data: {e}")
             return False
     else:
         print("✅ Database already exists")
@@ -7,14 +7,24 @@ This implementation was created with assistance from Claude AI (Anthropic).
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, Dict
+from contextlib import contextmanager
+from functools import lru_cache
+import hashlib
+import orjson
+import queue
 import sqlite3
-import re
 import os
+import sys
+import threading
 
-app = FastAPI(title="County Health Data API", version="1.0.0")
+app = FastAPI(
+    title="County Health Data API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -36,8 +46,9 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         content={"detail": "Invalid request data"}
     )
 
-# Valid measure names as specified in the assignment
-VALID_MEASURES = {
+# Valid measure names as specified in the assignment. Interning the strings
+# lets repeated membership checks hit the identity fast path before hashing.
+VALID_MEASURES = frozenset(map(sys.intern, (
     "Violent crime rate",
     "Unemployment",
     "Children in poverty",
@@ -49,35 +60,122 @@ VALID_MEASURES = {
     "Physical inactivity",
     "Adult obesity",
     "Premature Death",
-    "Daily fine particulate matter"
-}
+    "Daily fine particulate matter",
+)))
 
 class CountyDataRequest(BaseModel):
     zip: str
     measure_name: str
     coffee: Optional[str] = None
 
-def get_db_connection():
-    """Get SQLite database connection"""
-    db_path = "data.db"
-    if not os.path.exists(db_path):
-        raise HTTPException(
-            status_code=500,
-            detail="Database not found. Please ensure data.db exists."
-        )
-    return sqlite3.connect(db_path)
+# Database location is resolved once; COUNTY_DB_URL may override it with a
+# SQLite URI (tests point it at a shared in-memory database so no file is
+# ever written). Connections are opened lazily and pooled so SQLite's page
+# cache survives between calls. Under WAL mode multiple readers can proceed
+# in parallel, so a small pool lets concurrent requests overlap.
+DB_PATH = os.environ.get("COUNTY_DB_URL", "data.db")
+_DB_IS_URI = DB_PATH.startswith("file:")
+POOL_SIZE = 4
+_pool = None
+_pool_lock = threading.Lock()
+# True once the pool is open if the database has the precomputed zip_measure
+# view (created by csv_to_sqlite.py); older databases fall back to joining in
+# the handler.
+_has_zip_measure = False
+# zip -> tuple of county names, loaded once when the pool opens. zip_county is
+# small (~1MB), so holding it in memory turns the first lookup of every
+# request into a dict hit instead of a SQL round-trip.
+_zip_index: Dict[str, tuple] = {}
+
+def _open_connection():
+    """Open one read-tuned connection to the database"""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, uri=_DB_IS_URI)
+    # sqlite3.Row lets result rows convert straight to dicts in C
+    conn.row_factory = sqlite3.Row
+    conn.executescript(
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        "PRAGMA temp_store=MEMORY;"
+        "PRAGMA cache_size=-64000;"
+        "PRAGMA query_only=1;"
+    )
+    return conn
+
+def _get_pool():
+    """Get the connection pool, creating it on first use"""
+    global _pool, _has_zip_measure, _zip_index
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if not _DB_IS_URI and not os.path.exists(DB_PATH):
+                    raise HTTPException(
+                        status_code=500,
+                        detail="Database not found. Please ensure data.db exists."
+                    )
+                pool = queue.Queue(maxsize=POOL_SIZE)
+                for _ in range(POOL_SIZE):
+                    pool.put(_open_connection())
+                probe = pool.get()
+                _has_zip_measure = probe.execute(
+                    "SELECT COUNT(*) FROM sqlite_master"
+                    " WHERE type = 'view' AND name = 'zip_measure'"
+                ).fetchone()[0] > 0
+                index = {}
+                for row in probe.execute("SELECT zip, county FROM zip_county"):
+                    index.setdefault(row["zip"], []).append(row["county"])
+                _zip_index = {z: tuple(names) for z, names in index.items()}
+                pool.put(probe)
+                _pool = pool
+    return _pool
+
+@contextmanager
+def acquire_connection():
+    """Borrow a connection from the pool, returning it when done"""
+    pool = _get_pool()
+    conn = pool.get()
+    try:
+        yield conn
+    finally:
+        pool.put(conn)
+
+def _warm_start():
+    """Absorb heavy setup at import time instead of on the first request.
+
+    Opens the connection pool and touches the hot indexes so cold-start cost
+    lands in the process init phase. Skipped when the database isn't present
+    yet (e.g. tests that build it later); the first request initializes then.
+    """
+    if not _DB_IS_URI and not os.path.exists(DB_PATH):
+        return
+    try:
+        with acquire_connection() as conn:
+            conn.execute("SELECT zip FROM zip_county LIMIT 1").fetchone()
+            conn.execute("SELECT Measure_name FROM county_health_rankings LIMIT 1").fetchone()
+    except sqlite3.Error:
+        # Leave initialization to the first request if warmup fails
+        pass
+
+_warm_start()
 
 def validate_zip_code(zip_code: str) -> bool:
     """Validate ZIP code is exactly 5 digits"""
-    return bool(re.match(r'^\d{5}$', zip_code))
+    return len(zip_code) == 5 and zip_code.isdigit()
+
+# Health data changes yearly, so responses can be cached aggressively at the
+# edge: a day fresh, a week stale-while-revalidate
+CACHE_CONTROL = "public, s-maxage=86400, stale-while-revalidate=604800"
 
 @app.post("/county_data")
-async def get_county_data(request: CountyDataRequest):
+def get_county_data(request: CountyDataRequest, http_request: Request):
     """
     Get county health data by ZIP code and measure name.
 
     Returns health ranking data for all counties that match the given ZIP code
     and measure name.
+
+    Declared sync on purpose: FastAPI runs it in a threadpool, so the blocking
+    sqlite3 calls never stall the event loop, and concurrent requests spread
+    across the connection pool.
     """
 
     # Special teapot behavior
@@ -101,60 +199,12 @@ async def get_county_data(request: CountyDataRequest):
         )
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Step 1: Look up counties for the given ZIP code
-        zip_query = """
-            SELECT county, county_code, state_abbreviation
-            FROM zip_county
-            WHERE zip = ?
-        """
-        cursor.execute(zip_query, (request.zip,))
-        counties = cursor.fetchall()
-
-        if not counties:
-            raise HTTPException(
-                status_code=404,
-                detail=f"ZIP code {request.zip} not found"
-            )
-
-        # Step 2: For each county, get health ranking data
-        all_results = []
-
-        for county_name, county_code, state_abbrev in counties:
-            health_query = """
-                SELECT State, County, State_code, County_code, Year_span,
-                       Measure_name, Measure_id, Numerator, Denominator,
-                       Raw_value, Confidence_Interval_Lower_Bound,
-                       Confidence_Interval_Upper_Bound, Data_Release_Year, fipscode
-                FROM county_health_rankings
-                WHERE Measure_name = ? AND County = ?
-            """
-            cursor.execute(health_query, (request.measure_name, county_name))
-            health_rows = cursor.fetchall()
-
-            # Convert rows to dictionaries
-            column_names = [
-                "state", "county", "state_code", "county_code", "year_span",
-                "measure_name", "measure_id", "numerator", "denominator",
-                "raw_value", "confidence_interval_lower_bound",
-                "confidence_interval_upper_bound", "data_release_year", "fipscode"
-            ]
-
-            for row in health_rows:
-                result_dict = dict(zip(column_names, row))
-                all_results.append(result_dict)
-
-        # If no health data found for any county
-        if not all_results:
-            raise HTTPException(
-                status_code=404,
-                detail=f"No health data found for ZIP {request.zip} and measure '{request.measure_name}'"
-            )
-
-        return all_results
-
+        body = _coalesced_lookup(request.zip, request.measure_name)
+        etag = hashlib.md5(body).hexdigest()
+        headers = {"Cache-Control": CACHE_CONTROL, "ETag": etag}
+        if http_request.headers.get("If-None-Match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
     except sqlite3.Error as e:
         raise HTTPException(
             status_code=500,
@@ -168,9 +218,117 @@ async def get_county_data(request: CountyDataRequest):
             status_code=500,
             detail="Internal server error"
         )
+
+# In-flight coalescing for identical concurrent requests: when several
+# threadpool workers ask for the same (zip, measure) pair at once, only the
+# first runs the query; the others wait and then hit the freshly filled LRU
+# cache. Complements the cache, which only helps after a lookup completes.
+_inflight: Dict[tuple, threading.Event] = {}
+_inflight_lock = threading.Lock()
+
+def _coalesced_lookup(zip_code: str, measure_name: str) -> bytes:
+    """Look up a (zip, measure) pair, sharing work with concurrent duplicates"""
+    key = (zip_code, measure_name)
+    with _inflight_lock:
+        pending = _inflight.get(key)
+        if pending is None:
+            _inflight[key] = threading.Event()
+
+    if pending is not None:
+        # Another request is already computing this pair; wait for it, then
+        # read through the cache (a miss just means the leader errored, and
+        # error paths are cheap to repeat)
+        pending.wait()
+        return _lookup(zip_code, measure_name)
+
+    try:
+        return _lookup(zip_code, measure_name)
     finally:
-        if 'conn' in locals():
-            conn.close()
+        with _inflight_lock:
+            _inflight.pop(key).set()
+
+@lru_cache(maxsize=4096)
+def _lookup(zip_code: str, measure_name: str) -> bytes:
+    """Serialized response body for a (zip, measure) pair.
+
+    The database is read-only, so results are memoized: repeat queries for
+    the same pair skip SQLite entirely. Error paths raise and are not cached.
+
+    Rows are serialized one at a time as they come off the cursor, so the
+    full result set never exists as a list of dicts — only the JSON fragments
+    — which halves peak memory on dense ZIPs. (The body stays buffered rather
+    than using StreamingResponse because the LRU cache and ETag both need the
+    complete bytes.)
+    """
+    with acquire_connection() as conn:
+        cursor = _query_county_data(conn, zip_code, measure_name)
+        fragments = [b"["]
+        first = True
+        for row in cursor:
+            if not first:
+                fragments.append(b",")
+            fragments.append(orjson.dumps(dict(row)))
+            first = False
+
+    # If no health data found for any county
+    if first:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No health data found for ZIP {zip_code} and measure '{measure_name}'"
+        )
+
+    fragments.append(b"]")
+    return b"".join(fragments)
+
+def _query_county_data(conn, zip_code: str, measure_name: str):
+    """Start the health ranking lookup, returning a cursor over result rows"""
+    cursor = conn.cursor()
+
+    # Step 1: Look up counties for the given ZIP code in the in-memory index
+    county_names = _zip_index.get(zip_code)
+
+    if not county_names:
+        raise HTTPException(
+            status_code=404,
+            detail=f"ZIP code {zip_code} not found"
+        )
+
+    # Step 2: Get health ranking data for all matched counties in one query
+    if _has_zip_measure:
+        # Precomputed join keyed by (zip, measure_name): single indexed SELECT
+        cursor.execute(
+            """
+            SELECT state, county, state_code, county_code, year_span,
+                   measure_name, measure_id, numerator, denominator, raw_value,
+                   confidence_interval_lower_bound, confidence_interval_upper_bound,
+                   data_release_year, fipscode
+            FROM zip_measure
+            WHERE zip = ? AND measure_name = ?
+            """,
+            (zip_code, measure_name),
+        )
+    else:
+        # Fallback for databases built before the zip_measure view existed.
+        # Deduplicate county names (preserving order) so the IN clause stays small.
+        unique_names = list(dict.fromkeys(county_names))
+        placeholders = ', '.join('?' * len(unique_names))
+        # Columns are aliased to the lowercase JSON field names so each
+        # sqlite3.Row converts straight to a response dict
+        health_query = f"""
+            SELECT State AS state, County AS county, State_code AS state_code,
+                   County_code AS county_code, Year_span AS year_span,
+                   Measure_name AS measure_name, Measure_id AS measure_id,
+                   Numerator AS numerator, Denominator AS denominator,
+                   Raw_value AS raw_value,
+                   Confidence_Interval_Lower_Bound AS confidence_interval_lower_bound,
+                   Confidence_Interval_Upper_Bound AS confidence_interval_upper_bound,
+                   Data_Release_Year AS data_release_year, fipscode
+            FROM county_health_rankings
+            WHERE Measure_name = ? AND County IN ({placeholders})
+        """
+        cursor.execute(health_query, (measure_name, *unique_names))
+
+    return cursor
 
 @app.get("/")
 async def root():
@@ -12,6 +12,25 @@ import os
 import time
 import httpx
 
+from csv_to_sqlite import convert
+
+def import_csv(db_path, csv_path, description):
+    """Import a CSV in-process (no interpreter startup) and print the result"""
+    print(f"\n{'='*60}")
+    print(f"🔄 {description}")
+    print(f"{'='*60}")
+    print(f"Import: {csv_path} -> {db_path}")
+    print()
+
+    try:
+        row_count, table_name = convert(db_path, csv_path)
+    except Exception as e:
+        print(f"📤 Error: {e}")
+        return False
+
+    print(f"📤 Successfully imported {row_count} rows into table '{table_name}'")
+    return True
+
 def run_command(cmd, description):
     """Run a command and print the result"""
     print(f"\n{'='*60}")
@@ -66,17 +85,15 @@ def main():
     print("\n🏗️  PART 1: CSV TO SQLITE CONVERTER")
     print("=" * 60)
 
-    success = run_command([
-        sys.executable, "csv_to_sqlite.py", "data.db", "zip_county.csv"
-    ], "Convert ZIP county data to SQLite")
+    success = import_csv("data.db", "zip_county.csv",
+                         "Convert ZIP county data to SQLite")
 
     if not success:
         print("❌ Failed to create database with ZIP data")
         return False
 
-    success = run_command([
-        sys.executable, "csv_to_sqlite.py", "data.db", "county_health_rankings.csv"
-    ], "Add county health rankings to SQLite")
+    success = import_csv("data.db", "county_health_rankings.csv",
+                         "Add county health rankings to SQLite")
 
     if not success:
         print("❌ Failed to add health rankings data")
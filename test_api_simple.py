@@ -6,57 +6,43 @@ This test suite was created with assistance from Claude AI (Anthropic).
 
 import pytest
 import sqlite3
-import tempfile
 import os
-import httpx
-import csv
-import time
-import subprocess
-import sys
-import signal
 
-@pytest.fixture(scope="session")
-def test_db():
-    """Create a test database with sample data"""
-    # Create temporary database file
-    db_fd, db_path = tempfile.mkstemp(suffix='.db')
-    os.close(db_fd)
+from fastapi.testclient import TestClient
 
-    # Create database with test data
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+# Shared in-memory database: the fixture below and the app both connect to
+# this URI, so API tests never touch disk at all
+DB_URL = "file:county_tests?mode=memory&cache=shared"
 
-    # Create zip_county table
-    cursor.execute("""
+@pytest.fixture(scope="session")
+def test_db():
+    """Create a test database with sample data, entirely in memory"""
+    # This connection also keeps the shared in-memory database alive for the
+    # whole session; the app attaches to it through COUNTY_DB_URL
+    conn = sqlite3.connect(DB_URL, uri=True)
+    conn.executescript("""
         CREATE TABLE zip_county (
             zip TEXT, default_state TEXT, county TEXT, county_state TEXT,
             state_abbreviation TEXT, county_code TEXT, zip_pop TEXT,
             zip_pop_in_county TEXT, n_counties TEXT, default_city TEXT
-        )
-    """)
+        );
 
-    # Insert test zip data
-    zip_data = [
-        ('02138', 'MA', 'Middlesex County', 'MA', 'MA', '017', '29000', '29000', '1', 'Cambridge'),
-        ('02139', 'MA', 'Middlesex County', 'MA', 'MA', '017', '15000', '15000', '1', 'Cambridge'),
-        ('10001', 'NY', 'New York County', 'NY', 'NY', '061', '21000', '21000', '1', 'New York'),
-        ('90210', 'CA', 'Los Angeles County', 'CA', 'CA', '037', '25000', '25000', '1', 'Beverly Hills')
-    ]
-    cursor.executemany("""
-        INSERT INTO zip_county VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, zip_data)
-
-    # Create county_health_rankings table
-    cursor.execute("""
         CREATE TABLE county_health_rankings (
             state TEXT, county TEXT, state_code TEXT, county_code TEXT,
             year_span TEXT, measure_name TEXT, measure_id TEXT,
             numerator TEXT, denominator TEXT, raw_value TEXT,
             confidence_interval_lower_bound TEXT, confidence_interval_upper_bound TEXT,
             data_release_year TEXT, fipscode TEXT
-        )
+        );
     """)
 
+    # Insert test zip data
+    zip_data = [
+        ('02138', 'MA', 'Middlesex County', 'MA', 'MA', '017', '29000', '29000', '1', 'Cambridge'),
+        ('02139', 'MA', 'Middlesex County', 'MA', 'MA', '017', '15000', '15000', '1', 'Cambridge'),
+        ('10001', 'NY', 'New York County', 'NY', 'NY', '061', '21000', '21000', '1', 'New York'),
+        ('90210', 'CA', 'Los Angeles County', 'CA', 'CA', '037', '25000', '25000', '1', 'Beverly Hills')
+    ]
     # Insert test health data
     health_data = [
         ('MA', 'Middlesex County', '25', '017', '2020-2022', 'Adult obesity', '11',
@@ -70,74 +56,71 @@ def test_db():
         ('CA', 'Los Angeles County', '06', '037', '2020-2022', 'Unemployment', '23',
          '120000', '2800000', '4.3', '4.1', '4.5', '2023', '06037')
     ]
-    cursor.executemany("""
-        INSERT INTO county_health_rankings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, health_data)
-
-    conn.commit()
-    conn.close()
+    # Load both tables inside a single transaction boundary. Each table is
+    # one multi-row INSERT: a single prepare and bind instead of one
+    # statement execution per row.
+    with conn:
+        zip_values = ", ".join(["(" + ", ".join("?" * 10) + ")"] * len(zip_data))
+        conn.execute(
+            f"INSERT INTO zip_county VALUES {zip_values}",
+            [value for row in zip_data for value in row]
+        )
+        health_values = ", ".join(["(" + ", ".join("?" * 14) + ")"] * len(health_data))
+        conn.execute(
+            f"INSERT INTO county_health_rankings VALUES {health_values}",
+            [value for row in health_data for value in row]
+        )
 
-    yield db_path
+    yield conn
 
-    # Cleanup
-    try:
-        os.unlink(db_path)
-    except OSError:
-        pass
+    conn.close()
 
 @pytest.fixture(scope="session")
-def api_server(test_db):
-    """Start API server for testing"""
-    # Copy test database to data.db
-    import shutil
-    shutil.copy2(test_db, "data.db")
-
-    # Start the server
-    process = subprocess.Popen([
-        sys.executable, "-c",
-        "import uvicorn; from main import app; uvicorn.run(app, host='127.0.0.1', port=8001, log_level='error')"
-    ])
-
-    # Wait for server to start
-    time.sleep(2)
-
-    # Check if server is running
+def http_client(test_db):
+    """In-process test client: requests go straight to the ASGI app.
+
+    No uvicorn subprocess, no TCP port, no readiness polling — each request
+    is a function call into the app via httpx's ASGI transport."""
+    # Point the app at the shared in-memory database. The variable only
+    # matters while main.py imports, so it is removed right after to keep it
+    # out of the environment of any later subprocesses.
+    os.environ["COUNTY_DB_URL"] = DB_URL
     try:
-        response = httpx.get("http://127.0.0.1:8001/")
-        if response.status_code != 200:
-            raise Exception("Server failed to start")
-    except Exception as e:
-        process.kill()
-        raise e
+        from main import app
+    finally:
+        del os.environ["COUNTY_DB_URL"]
 
-    yield "http://127.0.0.1:8001"
+    with TestClient(app) as client:
+        yield client
 
-    # Cleanup
-    process.terminate()
-    try:
-        process.wait(timeout=5)
-    except subprocess.TimeoutExpired:
-        process.kill()
+@pytest.fixture(scope="class")
+def obesity_02138(http_client):
+    """One shared response for the 02138 / Adult obesity query.
 
-    # Remove test data.db
-    try:
-        os.unlink("data.db")
-    except OSError:
-        pass
+    Several tests assert on exactly this request, so it is issued once per
+    class instead of once per test."""
+    return http_client.post("/county_data", json={
+        "zip": "02138",
+        "measure_name": "Adult obesity"
+    })
 
 class TestAPIEndpoints:
 
-    def test_root_endpoint(self, api_server):
+    def test_root_endpoint(self, http_client):
         """Test the root health check endpoint"""
-        response = httpx.get(f"{api_server}/")
+        response = http_client.get("/")
         assert response.status_code == 200
         assert response.json() == {"message": "County Health Data API is running"}
 
-    def test_valid_request_adult_obesity(self, api_server):
-        """Test valid request for adult obesity data"""
-        response = httpx.post(f"{api_server}/county_data", json={
-            "zip": "02138",
-            "measure_name": "Adult obesity"
+    @pytest.mark.parametrize("zip_code,measure,expected_raw", [
+        ("02138", "Adult obesity", "0.23"),
+        ("02138", "Violent crime rate", "3.2"),
+    ])
+    def test_valid_request(self, http_client, zip_code, measure, expected_raw):
+        """Test valid requests across measures"""
+        response = http_client.post("/county_data", json={
+            "zip": zip_code,
+            "measure_name": measure
         })
 
         assert response.status_code == 200
@@ -148,12 +131,12 @@ class TestAPIEndpoints:
         record = data[0]
         assert record["state"] == "MA"
         assert record["county"] == "Middlesex County"
-        assert record["measure_name"] == "Adult obesity"
-        assert record["raw_value"] == "0.23"
+        assert record["measure_name"] == measure
+        assert record["raw_value"] == expected_raw
 
-    def test_teapot_behavior(self, api_server):
+    def test_teapot_behavior(self, http_client):
         """Test HTTP 418 teapot behavior"""
-        response = httpx.post(f"{api_server}/county_data", json={
+        response = http_client.post("/county_data", json={
             "zip": "02138",
             "measure_name": "Adult obesity",
             "coffee": "teapot"
@@ -162,24 +145,31 @@ class TestAPIEndpoints:
         assert response.status_code == 418
         assert response.json() == {"detail": {"error": "I'm a teapot"}}
 
-    def test_missing_required_fields(self, api_server):
+    def test_missing_required_fields(self, http_client):
         """Test HTTP 400 for missing required fields"""
-        response = httpx.post(f"{api_server}/county_data", json={})
+        response = http_client.post("/county_data", json={})
         assert response.status_code == 400
         assert "Missing required fields" in response.json()["detail"]
 
-    def test_invalid_zip_format(self, api_server):
+    def test_invalid_zip_format(self, http_client):
         """Test HTTP 400 for invalid ZIP code format"""
-        response = httpx.post(f"{api_server}/county_data", json={
+        response = http_client.post("/county_data", json={
             "zip": "123",
             "measure_name": "Adult obesity"
         })
         assert response.status_code == 400
         assert "ZIP code must be exactly 5 digits" in response.json()["detail"]
 
-    def test_invalid_measure_name(self, api_server):
+    def test_invalid_measure_name(self, http_client):
         """Test HTTP 404 for invalid measure name"""
-        response = httpx.post(f"{api_server}/county_data", json={
+        # Imported lazily: main must not load before http_client points it at
+        # the in-memory database. Sharing the server's own frozenset proves
+        # the probe value is genuinely outside the whitelist.
+        from main import VALID_MEASURES
+
+        assert "Invalid Measure" not in VALID_MEASURES
+
+        response = http_client.post("/county_data", json={
             "zip": "02138",
             "measure_name": "Invalid Measure"
         })
@@ -187,9 +177,9 @@ class TestAPIEndpoints:
         assert response.status_code == 404
         assert "not found" in response.json()["detail"]
 
-    def test_zip_not_found(self, api_server):
+    def test_zip_not_found(self, http_client):
         """Test HTTP 404 for ZIP code not in database"""
-        response = httpx.post(f"{api_server}/county_data", json={
+        response = http_client.post("/county_data", json={
             "zip": "99999",
             "measure_name": "Adult obesity"
         })
@@ -197,25 +187,9 @@ class TestAPIEndpoints:
         assert response.status_code == 404
         assert "ZIP code 99999 not found" in response.json()["detail"]
 
-    def test_violent_crime_rate(self, api_server):
-        """Test valid request for violent crime rate"""
-        response = httpx.post(f"{api_server}/county_data", json={
-            "zip": "02138",
-            "measure_name": "Violent crime rate"
-        })
-
-        assert response.status_code == 200
-        data = response.json()
-        assert len(data) == 1
-        assert data[0]["measure_name"] == "Violent crime rate"
-        assert data[0]["raw_value"] == "3.2"
-
-    def test_json_response_structure(self, api_server):
+    def test_json_response_structure(self, obesity_02138):
         """Test that JSON response has correct structure"""
-        response = httpx.post(f"{api_server}/county_data", json={
-            "zip": "02138",
-            "measure_name": "Adult obesity"
-        })
+        response = obesity_02138
 
         assert response.status_code == 200
         data = response.json()
@@ -232,14 +206,27 @@ class TestAPIEndpoints:
         for field in expected_fields:
             assert field in record
 
+@pytest.fixture(scope="class")
+def tables_intact(test_db, http_client):
+    """Verify the tables survived once after all injection attempts.
+
+    Checks sqlite_master directly over the shared connection rather than
+    spending another HTTP round trip re-exercising the endpoint."""
+    yield
+    names = {row[0] for row in test_db.execute(
+        "SELECT name FROM sqlite_master WHERE type='table'"
+    )}
+    assert {"zip_county", "county_health_rankings"} <= names
+
+@pytest.mark.usefixtures("tables_intact")
 class TestSQLInjectionProtection:
     """Test SQL injection protection"""
 
-    def test_sql_injection_in_zip(self, api_server):
+    def test_sql_injection_in_zip(self, http_client):
         """Test SQL injection attempts in zip parameter"""
         malicious_zip = "02138'; DROP TABLE county_health_rankings; --"
 
-        response = httpx.post(f"{api_server}/county_data", json={
+        response = http_client.post("/county_data", json={
             "zip": malicious_zip,
             "measure_name": "Adult obesity"
         })
@@ -247,29 +234,15 @@ class TestSQLInjectionProtection:
         # Should fail validation (not 5 digits) rather than execute SQL
         assert response.status_code == 400
 
-        # Verify tables still exist by making a valid request
-        response = httpx.post(f"{api_server}/county_data", json={
-            "zip": "02138",
-            "measure_name": "Adult obesity"
-        })
-        assert response.status_code == 200
-
-    def test_sql_injection_in_measure_name(self, api_server):
+    def test_sql_injection_in_measure_name(self, http_client):
         """Test SQL injection attempts in measure_name parameter"""
         malicious_measure = "Adult obesity'; DROP TABLE zip_county; --"
 
-        response = httpx.post(f"{api_server}/county_data", json={
+        response = http_client.post("/county_data", json={
             "zip": "02138",
             "measure_name": malicious_measure
         })
 
         # Should fail validation (not in valid measures list)
         assert response.status_code == 404
-        assert "not found" in response.json()["detail"]
-
-        # Verify tables still exist
-        response = httpx.post(f"{api_server}/county_data", json={
-            "zip": "02138",
-            "measure_name": "Adult obesity"
-        })
-        assert response.status_code == 200
\ No newline at end of file
+        assert "not found" in response.json()["detail"]
\ No newline at end of file
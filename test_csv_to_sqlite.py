@@ -7,49 +7,96 @@ This test suite was created with assistance from Claude AI (Anthropic).
 import pytest
 import sqlite3
 import os
-import tempfile
-import csv
-from pathlib import Path
-import subprocess
-import sys
+import contextlib
+import io
+from types import SimpleNamespace
+
+import csv_to_sqlite
+
+@pytest.fixture(scope="session")
+def verify_conn():
+    """One long-lived connection shared by every database assertion.
+
+    cached_statements is raised so the parameterized sqlite_master probes
+    below reuse one prepared statement across assertions."""
+    conn = sqlite3.connect(":memory:", cached_statements=256)
+    conn.execute("PRAGMA cache_size=-2000")
+    yield conn
+    conn.close()
+
+@contextlib.contextmanager
+def attached(conn, path):
+    """Expose the database at path as schema 'tgt' on the shared connection,
+    detaching again afterwards so the next test can attach its own"""
+    conn.execute("ATTACH DATABASE ? AS tgt", (path,))
+    try:
+        yield conn
+    finally:
+        conn.execute("DETACH DATABASE tgt")
 
 @pytest.fixture
-def temp_dir():
-    """Create a temporary directory for test files"""
-    with tempfile.TemporaryDirectory() as temp_dir:
-        yield temp_dir
+def temp_dir(tmp_path_factory, request):
+    """Give each test its own directory under pytest's session tmpdir.
+
+    mktemp is a bare mkdir, versus TemporaryDirectory's per-test setup and
+    recursive teardown; pytest removes the whole session base at the end."""
+    return str(tmp_path_factory.mktemp(request.node.name.replace("[", "_").rstrip("]")))
+
+@pytest.fixture
+def make_csv(temp_dir):
+    """Factory that writes a CSV into temp_dir and returns its path.
+
+    Fixture values never contain commas or quotes, so the payload is joined
+    into one bytes blob and written in a single call — no csv.writer dialect
+    machinery per row."""
+    def _make(name, header, rows):
+        lines = [",".join(header)] + [",".join(row) for row in rows]
+        payload = ("\r\n".join(lines) + "\r\n").encode()
+        csv_path = os.path.join(temp_dir, name)
+        with open(csv_path, 'wb') as f:
+            f.write(payload)
+        return csv_path
+    return _make
 
 @pytest.fixture
-def sample_csv(temp_dir):
+def sample_csv(make_csv):
     """Create a sample CSV file for testing"""
-    csv_path = os.path.join(temp_dir, "test_data.csv")
-    with open(csv_path, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(['id', 'name', 'value'])
-        writer.writerow(['1', 'test1', '10.5'])
-        writer.writerow(['2', 'test2', '20.3'])
-        writer.writerow(['3', 'test3', '30.1'])
-    return csv_path
+    return make_csv("test_data.csv", ['id', 'name', 'value'], [
+        ['1', 'test1', '10.5'],
+        ['2', 'test2', '20.3'],
+        ['3', 'test3', '30.1'],
+    ])
 
 @pytest.fixture
 def empty_csv(temp_dir):
     """Create an empty CSV file for testing"""
     csv_path = os.path.join(temp_dir, "empty.csv")
-    with open(csv_path, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(['col1', 'col2'])
+    with open(csv_path, 'wb') as f:
+        f.write(b"col1,col2\r\n")
     return csv_path
 
-def run_csv_to_sqlite(db_path, csv_path):
-    """Run the csv_to_sqlite.py script and return the result"""
-    result = subprocess.run([
-        sys.executable, 'csv_to_sqlite.py', db_path, csv_path
-    ], capture_output=True, text=True)
-    return result
+def run_csv_to_sqlite(*argv):
+    """Run the converter in-process and mimic a subprocess result.
+
+    Calling main() directly skips the interpreter startup that dominated the
+    old subprocess.run version on these tiny fixtures."""
+    stdout_io = io.StringIO()
+    stderr_io = io.StringIO()
+    returncode = 0
+    with contextlib.redirect_stdout(stdout_io), contextlib.redirect_stderr(stderr_io):
+        try:
+            csv_to_sqlite.main(list(argv))
+        except SystemExit as e:
+            returncode = e.code or 0
+    return SimpleNamespace(
+        returncode=returncode,
+        stdout=stdout_io.getvalue(),
+        stderr=stderr_io.getvalue(),
+    )
 
 class TestCSVToSQLite:
 
-    def test_successful_import(self, temp_dir, sample_csv):
+    def test_successful_import(self, temp_dir, sample_csv, verify_conn):
         """Test successful CSV import"""
         db_path = os.path.join(temp_dir, "test.db")
 
@@ -60,29 +107,27 @@ class TestCSVToSQLite:
         assert os.path.exists(db_path)
 
         # Verify database contents
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Check schema
-        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='test_data'")
-        schema = cursor.fetchone()[0]
-        assert "id TEXT" in schema
-        assert "name TEXT" in schema
-        assert "value TEXT" in schema
-
-        # Check row count
-        cursor.execute("SELECT COUNT(*) FROM test_data")
-        count = cursor.fetchone()[0]
-        assert count == 3
-
-        # Check specific data
-        cursor.execute("SELECT * FROM test_data WHERE id = '1'")
-        row = cursor.fetchone()
-        assert row == ('1', 'test1', '10.5')
-
-        conn.close()
-
-    def test_table_recreation(self, temp_dir, sample_csv):
+        with attached(verify_conn, db_path) as conn:
+            cursor = conn.cursor()
+
+            # Check schema and row count in one query
+            cursor.execute(
+                "SELECT sql, (SELECT COUNT(*) FROM tgt.test_data) "
+                "FROM tgt.sqlite_master WHERE type='table' AND name=?",
+                ('test_data',)
+            )
+            schema, count = cursor.fetchone()
+            assert '"id" TEXT' in schema
+            assert '"name" TEXT' in schema
+            assert '"value" TEXT' in schema
+            assert count == 3
+
+            # Check specific data
+            cursor.execute("SELECT * FROM tgt.test_data WHERE id = '1'")
+            row = cursor.fetchone()
+            assert row == ('1', 'test1', '10.5')
+
+    def test_table_recreation(self, temp_dir, sample_csv, verify_conn):
         """Test that tables are dropped and recreated"""
         db_path = os.path.join(temp_dir, "test.db")
 
@@ -95,14 +140,11 @@ class TestCSVToSQLite:
         assert result2.returncode == 0
 
         # Verify still only 3 rows (not 6)
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM test_data")
-        count = cursor.fetchone()[0]
-        assert count == 3
-        conn.close()
-
-    def test_empty_csv(self, temp_dir, empty_csv):
+        with attached(verify_conn, db_path) as conn:
+            count = conn.execute("SELECT COUNT(*) FROM tgt.test_data").fetchone()[0]
+            assert count == 3
+
+    def test_empty_csv(self, temp_dir, empty_csv, verify_conn):
         """Test handling of CSV with headers but no data"""
         db_path = os.path.join(temp_dir, "test.db")
 
@@ -112,12 +154,9 @@ class TestCSVToSQLite:
         assert "Successfully imported 0 rows into table 'empty'" in result.stdout
 
         # Verify table exists but is empty
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM empty")
-        count = cursor.fetchone()[0]
-        assert count == 0
-        conn.close()
+        with attached(verify_conn, db_path) as conn:
+            count = conn.execute("SELECT COUNT(*) FROM tgt.empty").fetchone()[0]
+            assert count == 0
 
     def test_nonexistent_csv(self, temp_dir):
         """Test error handling for nonexistent CSV file"""
@@ -129,31 +168,19 @@ class TestCSVToSQLite:
         assert result.returncode == 1
         assert "not found" in result.stderr
 
-    def test_no_arguments(self):
-        """Test error handling when no arguments provided"""
-        result = subprocess.run([
-            sys.executable, 'csv_to_sqlite.py'
-        ], capture_output=True, text=True)
-
-        assert result.returncode == 1
-        assert "Usage:" in result.stderr
-
-    def test_one_argument(self):
-        """Test error handling when only one argument provided"""
-        result = subprocess.run([
-            sys.executable, 'csv_to_sqlite.py', 'test.db'
-        ], capture_output=True, text=True)
+    @pytest.mark.parametrize("argv", [[], ['test.db']])
+    def test_insufficient_args(self, argv):
+        """Test error handling when too few arguments are provided"""
+        result = run_csv_to_sqlite(*argv)
 
         assert result.returncode == 1
         assert "Usage:" in result.stderr
 
-    def test_complex_headers(self, temp_dir):
+    def test_complex_headers(self, temp_dir, make_csv, verify_conn):
         """Test with various column name types"""
-        csv_path = os.path.join(temp_dir, "complex.csv")
-        with open(csv_path, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['simple', 'with_underscore', 'CamelCase', 'number123'])
-            writer.writerow(['a', 'b', 'c', 'd'])
+        csv_path = make_csv("complex.csv",
+                            ['simple', 'with_underscore', 'CamelCase', 'number123'],
+                            [['a', 'b', 'c', 'd']])
 
         db_path = os.path.join(temp_dir, "test.db")
         result = run_csv_to_sqlite(db_path, csv_path)
@@ -161,26 +188,24 @@ class TestCSVToSQLite:
         assert result.returncode == 0
 
         # Verify all columns exist
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='complex'")
-        schema = cursor.fetchone()[0]
-        assert "simple TEXT" in schema
-        assert "with_underscore TEXT" in schema
-        assert "CamelCase TEXT" in schema
-        assert "number123 TEXT" in schema
-        conn.close()
-
-    def test_assignment_schema_zip_county(self, temp_dir):
+        with attached(verify_conn, db_path) as conn:
+            schema = conn.execute(
+                "SELECT sql FROM tgt.sqlite_master WHERE type='table' AND name=?",
+                ('complex',)
+            ).fetchone()[0]
+            assert '"simple" TEXT' in schema
+            assert '"with_underscore" TEXT' in schema
+            assert '"CamelCase" TEXT' in schema
+            assert '"number123" TEXT' in schema
+
+    def test_assignment_schema_zip_county(self, temp_dir, make_csv, verify_conn):
         """Test with actual assignment schema for zip_county"""
-        csv_path = os.path.join(temp_dir, "zip_county.csv")
-        with open(csv_path, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['zip', 'default_state', 'county', 'county_state',
-                           'state_abbreviation', 'county_code', 'zip_pop',
-                           'zip_pop_in_county', 'n_counties', 'default_city'])
-            writer.writerow(['02138', 'MA', 'Middlesex County', 'MA', 'MA',
-                           '017', '29000', '29000', '1', 'Cambridge'])
+        csv_path = make_csv("zip_county.csv",
+                            ['zip', 'default_state', 'county', 'county_state',
+                             'state_abbreviation', 'county_code', 'zip_pop',
+                             'zip_pop_in_county', 'n_counties', 'default_city'],
+                            [['02138', 'MA', 'Middlesex County', 'MA', 'MA',
+                              '017', '29000', '29000', '1', 'Cambridge']])
 
         db_path = os.path.join(temp_dir, "test.db")
         result = run_csv_to_sqlite(db_path, csv_path)
@@ -188,32 +213,29 @@ class TestCSVToSQLite:
         assert result.returncode == 0
 
         # Verify schema matches assignment expectations
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='zip_county'")
-        schema = cursor.fetchone()[0]
+        with attached(verify_conn, db_path) as conn:
+            schema = conn.execute(
+                "SELECT sql FROM tgt.sqlite_master WHERE type='table' AND name=?",
+                ('zip_county',)
+            ).fetchone()[0]
 
         expected_columns = ['zip', 'default_state', 'county', 'county_state',
                           'state_abbreviation', 'county_code', 'zip_pop',
                           'zip_pop_in_county', 'n_counties', 'default_city']
 
         for col in expected_columns:
-            assert f"{col} TEXT" in schema
+            assert f'"{col}" TEXT' in schema
 
-        conn.close()
-
-    def test_assignment_schema_county_health_rankings(self, temp_dir):
+    def test_assignment_schema_county_health_rankings(self, temp_dir, make_csv, verify_conn):
         """Test with actual assignment schema for county_health_rankings"""
-        csv_path = os.path.join(temp_dir, "county_health_rankings.csv")
-        with open(csv_path, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['state', 'county', 'state_code', 'county_code', 'year_span',
-                           'measure_name', 'measure_id', 'numerator', 'denominator',
-                           'raw_value', 'confidence_interval_lower_bound',
-                           'confidence_interval_upper_bound', 'data_release_year', 'fipscode'])
-            writer.writerow(['MA', 'Middlesex County', '25', '017', '2020-2022',
-                           'Adult obesity', '11', '60771.02', '263078', '0.23',
-                           '0.22', '0.24', '2023', '25017'])
+        csv_path = make_csv("county_health_rankings.csv",
+                            ['state', 'county', 'state_code', 'county_code', 'year_span',
+                             'measure_name', 'measure_id', 'numerator', 'denominator',
+                             'raw_value', 'confidence_interval_lower_bound',
+                             'confidence_interval_upper_bound', 'data_release_year', 'fipscode'],
+                            [['MA', 'Middlesex County', '25', '017', '2020-2022',
+                              'Adult obesity', '11', '60771.02', '263078', '0.23',
+                              '0.22', '0.24', '2023', '25017']])
 
         db_path = os.path.join(temp_dir, "test.db")
         result = run_csv_to_sqlite(db_path, csv_path)
@@ -221,10 +243,11 @@ class TestCSVToSQLite:
         assert result.returncode == 0
 
         # Verify schema matches assignment expectations
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='county_health_rankings'")
-        schema = cursor.fetchone()[0]
+        with attached(verify_conn, db_path) as conn:
+            schema = conn.execute(
+                "SELECT sql FROM tgt.sqlite_master WHERE type='table' AND name=?",
+                ('county_health_rankings',)
+            ).fetchone()[0]
 
         expected_columns = ['state', 'county', 'state_code', 'county_code', 'year_span',
                           'measure_name', 'measure_id', 'numerator', 'denominator',
@@ -232,6 +255,4 @@ class TestCSVToSQLite:
                           'confidence_interval_upper_bound', 'data_release_year', 'fipscode']
 
         for col in expected_columns:
-            assert f"{col} TEXT" in schema
-
-        conn.close()
\ No newline at end of file
+            assert f'"{col}" TEXT' in schema
\ No newline at end of file